@@ -13,27 +13,35 @@ Features:
 
 Run:
     python au_rpg_text.py
+    pypy3 au_rpg_text.py   (recommended: pure Python, so PyPy's JIT speeds up combat)
 """
 
-import json
-import os
+import copy
 import random
 import sys
+from array import array
+from collections import Counter
 from dataclasses import dataclass, field
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
 
 # -------------------------
 # DATA MODELS
 # -------------------------
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Item:
-    """Represents an item the player can carry and use."""
+    """
+    Represents an item the player can carry and use.
+    Immutable: each item is defined once in ITEM_TEMPLATES and every inventory slot
+    holding it shares that instance; saves store only the key.
+    """
+    key: str
     name: str
     description: str
-    effect: Dict  # e.g. {"heal": 30} or {"buff": ("strength", 2, 3)} or {"escape": 0.5}
+    kind: str = "misc"  # "heal", "buff", "escape" or "misc" (no use effect, e.g. maps)
+    payload: object = None  # heal: 30 | buff: ("strength", 2, 3) | escape: 0.5
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CharacterTemplate:
     """Template used at character selection."""
     key: str
@@ -41,19 +49,57 @@ class CharacterTemplate:
     desc: str
     base_stats: Dict[str, int]
 
-@dataclass
+@dataclass(frozen=True, slots=True)
+class EnemyTemplate:
+    """Static combat template for an enemy type (see ENEMIES)."""
+    name: str
+    hp: int
+    strength: int
+    agility: int
+    magic: int
+    moves: Tuple[Dict, ...]  # shared, read-only
+
+# Status effects: status i is active while bit i of Actor.status_mask is set,
+# with its remaining turns in Actor.status_dur[i].
+STATUS_NAMES = ("focused", "shaken")
+NUM_STATUSES = len(STATUS_NAMES)
+_FOCUSED_I, _SHAKEN_I = range(NUM_STATUSES)
+FOCUSED, SHAKEN = 1 << _FOCUSED_I, 1 << _SHAKEN_I
+
+def _no_statuses() -> array:
+    """Fresh all-zero status duration array."""
+    return array("B", bytes(NUM_STATUSES))
+
+@dataclass(slots=True)
 class Actor:
     """Represents a combatant (player or enemy)."""
     name: str
     max_hp: int
     hp: int
-    stats: Dict[str, int]
-    moves: List[Dict] = field(default_factory=list)
-    status_effects: Dict[str, int] = field(default_factory=dict)
+    strength: int
+    agility: int
+    magic: int
+    moves: Sequence[Dict] = field(default_factory=list)
+    status_mask: int = 0  # bit per active status (FOCUSED, SHAKEN, ...)
+    status_dur: array = field(default_factory=_no_statuses)  # turns left per status
+    extra_stats: Dict[str, int] = field(default_factory=dict)  # buffs to any stat beyond the core three
 
     def is_alive(self) -> bool:
         return self.hp > 0
 
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Read-only snapshot of all stats as a dict (for debugging/serialisation, not the combat path)."""
+        return {"strength": self.strength, "agility": self.agility, "magic": self.magic, **self.extra_stats}
+
+    @property
+    def status_effects(self) -> Dict[str, int]:
+        """Read-only view of active statuses as {name: turns left} (for debugging)."""
+        return {STATUS_NAMES[i]: d for i, d in enumerate(self.status_dur) if d}
+
+# Stats stored as Actor attributes; anything else goes to Actor.extra_stats.
+CORE_STATS = ("strength", "agility", "magic")
+
 # -------------------------
 # CHARACTER TEMPLATES
 # -------------------------
@@ -68,6 +114,38 @@ CHAR_TEMPLATES = [
     CharacterTemplate("dusttrust_sans", "Dusttrust! Sans", "Resilient, balanced build.", {"strength": 9, "agility": 9, "magic": 7}),
     CharacterTemplate("nightmare_sans", "Nightmare Sans", "Nightmarish boss; high power.", {"strength": 13, "agility": 4, "magic": 13}),
 ]
+# key -> template, for O(1) lookup when loading a save
+_TEMPLATE_BY_KEY = {t.key: t for t in CHAR_TEMPLATES}
+
+def new_player(template: CharacterTemplate) -> Actor:
+    """Create a fresh player Actor from a character template."""
+    stats = template.base_stats
+    hp = 60 + stats["strength"] * 2 + stats["magic"]
+    # create player Actor with a set of default moves
+    moves = [
+        {"name": "Attack", "base": stats["strength"], "type": "physical"},
+        {"name": "Magic", "base": stats["magic"], "type": "magic"},
+        {"name": "Focus", "base": 0, "type": "buff"},
+    ]
+    return Actor(name=template.display_name, max_hp=hp, hp=hp, strength=stats["strength"],
+                 agility=stats["agility"], magic=stats["magic"], moves=moves)
+
+# -------------------------
+# ITEM TEMPLATES
+# -------------------------
+ITEM_TEMPLATES = [
+    Item("small_potion", "Small Potion", "Heals 25 HP.", "heal", 25),
+    Item("smoke_bomb", "Smoke Bomb", "Escape attempt in combat (60%).", "escape", 0.6),
+    Item("herbal_salve", "Herbal Salve", "Heals 30 HP when used.", "heal", 30),
+    Item("tarnished_amulet", "Tarnished Amulet", "An old amulet. Grants +2 magic when used (permanent).", "buff", ("magic", 2, 999)),
+    Item("rusty_blade", "Rusty Blade", "An old blade that grants +2 strength when used (permanent).", "buff", ("strength", 2, 999)),
+    Item("hidden_map", "Hidden Map", "A map showing a secret entrance to the castle."),
+    Item("dungeon_map", "Dungeon Map", "Marks a secret entrance."),
+    Item("wolf_pelt", "Wolf Pelt", "A pelt of a spectral wolf."),
+]
+ITEMS = {it.key: it for it in ITEM_TEMPLATES}
+# older saves store items by name rather than key
+_ITEM_BY_NAME = {it.name: it for it in ITEM_TEMPLATES}
 
 # -------------------------
 # SAVE FILE
@@ -82,27 +160,84 @@ def clamp(n, a, b):
     """Clamp n between a and b."""
     return max(a, min(b, n))
 
-def prompt_choice(prompt: str, valid: List[str]) -> str:
+def prompt_choice(prompt: str, valid: Iterable[str]) -> str:
     """
     Prompt until the user enters a valid choice.
-    valid: list of valid lowercased responses (e.g. ['1','2','q'])
+    valid: valid lowercased responses (e.g. frozenset('12q')); pass a frozenset to avoid a copy
     Returns the chosen string (lowercased).
     """
+    valid = frozenset(valid)
     while True:
         resp = input(prompt).strip()
         if not resp:
             print("Please enter a choice.")
             continue
-        if resp.lower() in valid:
-            return resp.lower()
-        # Accept numeric if in valid list (e.g. '1','2')
-        if resp in valid:
-            return resp
+        low = resp.lower()
+        if low in valid:
+            return low
         print("Invalid option — try again.")
 
-def roll(min_v=1, max_v=20):
-    """Return a random integer simulating a dice roll."""
-    return random.randint(min_v, max_v)
+# Fixed menu choice sets for prompt_choice
+_START_MENU = frozenset("nlq")
+_ENDING_MENU = frozenset("snq")
+
+# Combat RNG batching (see TextGame._take_u32)
+_RNG_BATCH = 1024  # 32-bit words drawn per refill
+# Each combat round takes _ROUND_DRAWS words up front (TextGame._take_u32); slots:
+#   u[0] player d20      u[1] player damage jitter   u[2] enemy d20   u[3] enemy damage jitter
+#   u[4] flee chance     u[5] enemy move pick        u[6] reward      u[7] spare
+# Words are mapped to a range only through TextGame._below.
+_ROUND_DRAWS = 8
+
+# Flee chance in percent: 30% plus 2% per point of agility advantage, indexed by
+# (player agility - enemy agility) + 15. The table spans differences -15..35, where
+# the chance runs from 0% to 100%; beyond them it stays at 0% or 100%, so clamping
+# the index keeps the uncapped formula exact for any agility difference.
+_FLEE_MIN_DIFF = -15
+_FLEE_CHANCE_X100 = tuple(30 + 2 * d for d in range(_FLEE_MIN_DIFF, 36))
+_FLEE_MAX_IDX = len(_FLEE_CHANCE_X100) - 1
+
+# Combat outcomes returned by the round resolvers (TIMEOUT: simulate_fight only)
+WON, LOST, FLED, TIMEOUT = "won", "lost", "fled", "timeout"
+
+# -------------------------
+# COMBAT FORMULAS
+# -------------------------
+# Plain module-level functions on ints so the hit/damage math stays out of the
+# method bodies (and is easy for PyPy's JIT to specialise).
+
+# The dice are passed in (d20 in 1..20, jitter in the documented range) so the
+# caller decides where the randomness comes from.
+
+def resolve_physical(strength: int, agility: int, enemy_agility: int, d20: int, jitter: int) -> Tuple[bool, int]:
+    """Player physical attack: returns (hit, damage). Hit chance is influenced by agilities; jitter in -3..3."""
+    if d20 + agility // 2 < 8 + enemy_agility // 2:
+        return False, 0
+    # damage computation uses strength plus small randomness
+    damage = strength + jitter
+    return True, damage if damage > 1 else 1
+
+def resolve_magic(magic: int, enemy_agility: int, d20: int, jitter: int) -> Tuple[bool, int]:
+    """Player magic attack: returns (hit, damage). Uses magic stat; slightly different hit rules; jitter in -4..4."""
+    if d20 + magic // 2 < 7 + enemy_agility // 2:
+        return False, 0
+    damage = magic + jitter
+    return True, damage if damage > 1 else 1
+
+def enemy_physical_damage(base: int, strength: int, jitter: int) -> int:
+    """Enemy physical move damage (at least 1); jitter in -2..2."""
+    d = int(base + strength * 0.3) + jitter
+    return d if d > 1 else 1
+
+def enemy_magic_damage(base: int, magic: int, jitter: int) -> int:
+    """Enemy magic move damage (at least 1); jitter in -3..2."""
+    d = int(base + magic * 0.35) + jitter
+    return d if d > 1 else 1
+
+def enemy_drain_damage(base: int, magic: int) -> int:
+    """Enemy drain move damage (at least 1); the enemy heals half of it."""
+    d = int(base + magic * 0.25)
+    return d if d > 1 else 1
 
 # -------------------------
 # SCENES / STORY
@@ -117,7 +252,7 @@ def build_scenes():
       - choices: list of (text, next_scene_id, optional_effect)
     effect examples:
       {"enemy":"wolf_spirit"}
-      {"item": Item(...)}
+      {"item": ITEMS["rusty_blade"]}
       {"flag":"befriended_spirit"}
       {"ending":"ending_flee"}
     """
@@ -129,7 +264,7 @@ def build_scenes():
             "choices": [
                 ("Follow the path to the Abandoned Village", "village", None),
                 ("Head toward the towers of the Enchanted Castle", "approach_castle", None),
-                ("Search the glade for supplies", "glade_search", {"item": Item("Tarnished Amulet", "An old amulet. Grants +2 magic when used (permanent).", {"buff": ("magic", 2, 999)})}),
+                ("Search the glade for supplies", "glade_search", {"item": ITEMS["tarnished_amulet"]}),
             ],
         },
         "glade_search": {
@@ -137,7 +272,7 @@ def build_scenes():
             "desc": "You find a tarnished amulet and some scraps of old cloth. It might be useful.",
             "choices": [
                 ("Wear the amulet and continue to the village", "village", {"flag": "amulet_worn"}),
-                ("Pocket the amulet and head to the castle", "approach_castle", {"item": Item("Hidden Map", "A map showing a secret entrance to the castle.", {})}),
+                ("Pocket the amulet and head to the castle", "approach_castle", {"item": ITEMS["hidden_map"]}),
                 ("Leave the amulet and go to the village", "village", None),
             ],
         },
@@ -147,7 +282,7 @@ def build_scenes():
                      "see a flicker in a window."),
             "choices": [
                 ("Investigate the cellar noise", "cellar", None),
-                ("Search the houses for supplies", "village_search", {"item": Item("Rusty Blade", "An old blade that grants +2 strength when used (permanent).", {"buff": ("strength", 2, 999)})}),
+                ("Search the houses for supplies", "village_search", {"item": ITEMS["rusty_blade"]}),
                 ("Sneak quietly and move on to the road", "road", None),
             ],
         },
@@ -164,7 +299,7 @@ def build_scenes():
             "title": "Rummaging",
             "desc": "You find medicine and a torn map that points toward the Enchanted Castle's dungeons.",
             "choices": [
-                ("Keep the medicine and head to the castle", "approach_castle", {"item": Item("Herbal Salve", "Heals 30 HP when used.", {"heal": 30})}),
+                ("Keep the medicine and head to the castle", "approach_castle", {"item": ITEMS["herbal_salve"]}),
                 ("Trade the medicine with a villager (gain info)", "meet_guide", {"flag": "met_guide"}),
             ],
         },
@@ -279,7 +414,7 @@ def build_scenes():
             "title": "After the Bandit",
             "desc": "Bandits scatter. You find a map with a circled dungeon entrance.",
             "choices": [
-                ("Follow the map to the dungeons", "dungeons", {"item": Item("Dungeon Map", "Marks a secret entrance.", {})}),
+                ("Follow the map to the dungeons", "dungeons", {"item": ITEMS["dungeon_map"]}),
             ],
         },
         "dungeon_loot": {
@@ -319,53 +454,180 @@ def build_scenes():
         },
     }
 
+def _intern_effect(effect):
+    """Intern the string values (flag names, scene ids, ...) of a choice effect in place."""
+    if effect:
+        for k, v in effect.items():
+            if isinstance(v, str):
+                effect[k] = sys.intern(v)
+    return effect
+
+def compile_scenes(scenes):
+    """
+    Precompute per-scene render/lookup data so play() does no formatting per visit.
+    Scene ids, next-scene ids and effect strings (flags, endings, ...) are interned
+    so the dict lookups and comparisons in play() hit the identity fast path.
+    Adds to each scene:
+      - _rendered_choices: the numbered choice lines joined into one string
+      - _valid_inputs: frozenset of accepted inputs (choice numbers plus i/s/q)
+      - choice effects with an "ending" get _resolved_ending: the ending scene id to jump to
+      - _full_render: the whole scene display (header, description, choices and
+        command menu, or the ending banner) written with a single call
+    """
+    scenes = {sys.intern(k): v for k, v in scenes.items()}
+    for scene in scenes.values():
+        choices = scene["choices"] = [(text, sys.intern(next_scene), _intern_effect(effect))
+                                      for text, next_scene, effect in scene["choices"]]
+        for _, _, effect in choices:
+            if effect and "ending" in effect:
+                # resolve "peace" -> "ending_peace" (when that scene exists) once, not on every pick
+                ending_id = effect["ending"]
+                resolved = "ending_" + ending_id
+                effect["_resolved_ending"] = sys.intern(resolved if resolved in scenes else ending_id)
+        scene["_rendered_choices"] = "\n".join(f"{i}. {text}" for i, (text, _, _) in enumerate(choices, start=1))
+        scene["_valid_inputs"] = frozenset([str(i) for i in range(1, len(choices) + 1)] + ["i", "s", "q"])
+        header = f"\n== {scene['title']} ==\n{scene['desc']}\n"
+        if choices:
+            scene["_full_render"] = (header + scene["_rendered_choices"] +
+                                     "\nI. Inventory | S. Save | R. Rest (where available) | Q. Quit\n")
+        else:
+            scene["_full_render"] = header + f"\n*** ENDING: {scene['title']} ***\n{scene['desc']}\n"
+    return scenes
+
+# Scene graph is static: build it once at import and share it between games.
+SCENES = compile_scenes(build_scenes())
+
 # -------------------------
 # ENEMIES (combat templates)
 # -------------------------
+
 ENEMIES = {
-    "wolf_spirit": {"name": "Wolf Spirit", "hp": 45, "str": 8, "agi": 9, "mag": 5, "moves": [
+    "wolf_spirit": EnemyTemplate("Wolf Spirit", hp=45, strength=8, agility=9, magic=5, moves=(
         {"name": "Bite", "base": 8, "type": "physical"},
         {"name": "Howl", "base": 0, "type": "debuff"},
-    ]},
-    "bandit_chief": {"name": "Bandit Chief", "hp": 70, "str": 11, "agi": 8, "mag": 4, "moves": [
+    )),
+    "bandit_chief": EnemyTemplate("Bandit Chief", hp=70, strength=11, agility=8, magic=4, moves=(
         {"name": "Slash", "base": 10, "type": "physical"},
         {"name": "Poison Dart", "base": 4, "type": "magic"},
-    ]},
-    "nightmare_minion": {"name": "Nightmare Minion", "hp": 90, "str": 10, "agi": 7, "mag": 12, "moves": [
+    )),
+    "nightmare_minion": EnemyTemplate("Nightmare Minion", hp=90, strength=10, agility=7, magic=12, moves=(
         {"name": "Claw", "base": 11, "type": "physical"},
         {"name": "Night Rasp", "base": 8, "type": "magic"},
-    ]},
-    "throne_shadow": {"name": "Throne Shadow", "hp": 140, "str": 14, "agi": 6, "mag": 16, "moves": [
+    )),
+    "throne_shadow": EnemyTemplate("Throne Shadow", hp=140, strength=14, agility=6, magic=16, moves=(
         {"name": "Shadow Strike", "base": 15, "type": "physical"},
         {"name": "Abyssal Judgement", "base": 14, "type": "magic"},
         {"name": "Drain", "base": 6, "type": "drain"},
-    ]},
+    )),
+}
+
+# Intern move types so they match the _T_* keys of TextGame._move_handlers
+for _t in ENEMIES.values():
+    for _move in _t.moves:
+        _move["type"] = sys.intern(_move["type"])
+del _t, _move
+
+# Enemy prototypes built once from ENEMIES; spawn_enemy copies these instead of
+# building a fresh Actor from the template every combat.
+_ENEMY_PROTOTYPES: Dict[str, Actor] = {
+    k: Actor(t.name, t.hp, t.hp, t.strength, t.agility, t.magic, moves=t.moves)
+    for k, t in ENEMIES.items()
 }
 
+# -------------------------
+# ITEM EFFECTS
+# -------------------------
+# use_item dispatches on Item.kind; each function gets (game, item, inventory index).
+
+def _apply_heal(game, item: Item, idx: int):
+    old = game.player.hp
+    game.player.hp = clamp(game.player.hp + item.payload, 0, game.player.max_hp)
+    print(f"You used {item.name}: HP {old} -> {game.player.hp}.")
+    game.remove_item(idx)
+
+def _apply_escape(game, item: Item, idx: int):
+    print("That item is only usable in a fight to attempt escape.")
+
+def _apply_buff(game, item: Item, idx: int):
+    stat, amt, dur = item.payload
+    if stat in CORE_STATS:
+        setattr(game.player, stat, getattr(game.player, stat) + amt)
+    else:
+        game.player.extra_stats[stat] = game.player.extra_stats.get(stat, 0) + amt
+    print(f"{item.name} permanently increased your {stat} by {amt}.")
+    game.remove_item(idx)
+
+_ITEM_APPLY = {"heal": _apply_heal, "buff": _apply_buff, "escape": _apply_escape}
+
+def _items_from_save(entries) -> List[Item]:
+    """
+    Map saved inventory entries back to the shared item templates.
+    Entries are item keys; older saves store full tuples, matched by item name.
+    """
+    items = []
+    for entry in entries:
+        item = ITEMS.get(entry) if isinstance(entry, str) else _ITEM_BY_NAME.get(entry[0])
+        if item is not None:
+            items.append(item)
+    return items
+
+# Starting inventory (shared template instances)
+_STARTING_INV = (ITEMS["small_potion"], ITEMS["smoke_bomb"])
+
 # -------------------------
 # GAME CLASS: TEXT MODE
 # -------------------------
 
+# Interned keys for TextGame._combat_dispatch (action inputs) and
+# TextGame._move_handlers (enemy move types)
+_A1, _A2, _A3, _A4, _AF = map(sys.intern, ("1", "2", "3", "4", "f"))
+_T_PHYS, _T_MAG, _T_DRN, _T_DBF = map(sys.intern, ("physical", "magic", "drain", "debuff"))
+
 class TextGame:
     """
     The main text-mode game engine.
     Handles: player creation, scene navigation, combat, inventory, flags, saving/loading.
     """
-    def __init__(self):
-        # Scenes/story nodes
-        self.scenes = build_scenes()
+    def __init__(self, seed: Optional[int] = None, interactive: bool = True, quiet: bool = False):
+        # Scenes/story nodes (shared, read-only)
+        self.scenes = SCENES
         # Player data (to be filled after character selection)
         self.player: Optional[Actor] = None
         self.template: Optional[CharacterTemplate] = None
         # Inventory starts with a couple of items
-        self.inventory: List[Item] = [Item("Small Potion", "Heals 25 HP.", {"heal": 25}),
-                                     Item("Smoke Bomb", "Escape attempt in combat (60%).", {"escape": 0.6})]
+        self.inventory: List[Item] = []
+        # item name -> count held, kept in sync with self.inventory for O(1) "has item" checks
+        self._inventory_names: Counter = Counter()
+        self.set_inventory(_STARTING_INV)
         # map scene pointer: start at "start"
         self.current_scene = "start"
         # flags to track choices and influence endings
         self.flags = set()
-        # RNG seed for reproducibility during testing if desired (commented out)
-        # random.seed(12345)
+        # copy of the data last written by save_game; lets load_game skip the disk
+        self._last_snapshot: Optional[Dict] = None
+        # input -> handler tables for the scene loop commands and combat actions
+        self._scene_commands = {"i": self.show_inventory, "s": self.save_game, "q": self._quit_to_menu}
+        self._combat_dispatch = {_A1: self._attack, _A2: self._magic, _A3: self._use_item_combat,
+                                 _A4: self._focus, _AF: self._flee}
+        self._move_handlers = {_T_PHYS: self._enemy_physical, _T_MAG: self._enemy_magic,
+                               _T_DRN: self._enemy_drain, _T_DBF: self._enemy_debuff}
+        self._effect_handlers = {"enemy": self._eff_enemy, "item": self._eff_item, "heal": self._eff_heal,
+                                 "flag": self._eff_flag, "ending": self._eff_ending}
+        # Combat RNG: a private generator whose output is pulled in batches of raw
+        # 32-bit words (one randbytes() call per _RNG_BATCH draws) by _take_u32().
+        # Seeded once here: from os.urandom when seed is None, or with a fixed seed
+        # for reproducible runs during testing (e.g. TextGame(seed=12345)).
+        self._rng = random.Random(seed)
+        self._u32_buf: Sequence[int] = ()
+        self._u32_idx = 0
+        # Combat text: printed directly for a human player; with interactive=False
+        # (scripted/automated play) lines are buffered and written once per turn;
+        # with quiet=True (headless simulation) it is discarded.
+        self._out: List[str] = []
+        if quiet:
+            self._emit = lambda *args: None
+        else:
+            self._emit = print if interactive else self._out.append
 
     # -------------------------
     # Character selection
@@ -383,14 +645,7 @@ class TextGame:
             idx = int(choice) - 1
             if 0 <= idx < len(CHAR_TEMPLATES):
                 self.template = CHAR_TEMPLATES[idx]
-                hp = 60 + self.template.base_stats["strength"] * 2 + self.template.base_stats["magic"]
-                # create player Actor with a set of default moves
-                moves = [
-                    {"name": "Attack", "base": self.template.base_stats["strength"], "type": "physical"},
-                    {"name": "Magic", "base": self.template.base_stats["magic"], "type": "magic"},
-                    {"name": "Focus", "base": 0, "type": "buff"},
-                ]
-                self.player = Actor(name=self.template.display_name, max_hp=hp, hp=hp, stats=dict(self.template.base_stats), moves=moves)
+                self.player = new_player(self.template)
                 print(f"You chose {self.player.name}. HP: {self.player.hp}. Good luck!")
                 return
             print("Invalid selection; try again.")
@@ -400,47 +655,65 @@ class TextGame:
     # -------------------------
     def save_game(self):
         """Save the player's progress and flags to a JSON file."""
+        import json  # imported on first save; most sessions never save
         data = {
             "template": self.template.key if self.template else None,
             "player": {
                 "hp": self.player.hp,
                 "max_hp": self.player.max_hp,
-                "stats": self.player.stats,
+                "strength": self.player.strength,
+                "agility": self.player.agility,
+                "magic": self.player.magic,
+                "extra_stats": self.player.extra_stats,
             } if self.player else None,
-            "inventory": [(it.name, it.description, it.effect) for it in self.inventory],
+            "inventory": [it.key for it in self.inventory],
             "current_scene": self.current_scene,
             "flags": list(self.flags),
         }
         try:
+            snapshot = copy.deepcopy(data)
             with open(SAVE_FILE, "w") as f:
-                json.dump(data, f, indent=2)
+                # compact separators: no indentation work and a smaller file
+                json.dump(data, f, separators=(",", ":"))
+            self._last_snapshot = snapshot
             print(f"Game saved to {SAVE_FILE}.")
         except Exception as e:
             print("Save failed:", e)
 
-    def load_game(self):
-        """Load game state from a JSON file if it exists."""
-        if not os.path.exists(SAVE_FILE):
+    def load_game(self, from_disk: bool = False):
+        """
+        Load game state, reusing the in-memory snapshot of the last save when present.
+        Pass from_disk=True to force a re-read of the JSON file (e.g. for crash recovery).
+        """
+        import json  # imported lazily, like in save_game
+        import os
+        data = None if from_disk else self._last_snapshot
+        if data is None and not os.path.exists(SAVE_FILE):
             print("No save file found.")
             return
         try:
-            with open(SAVE_FILE, "r") as f:
-                data = json.load(f)
+            if data is None:
+                with open(SAVE_FILE, "r") as f:
+                    data = json.load(f)
             tpl_key = data.get("template")
-            tpl = next((t for t in CHAR_TEMPLATES if t.key == tpl_key), None)
+            tpl = _TEMPLATE_BY_KEY.get(tpl_key)
             if not tpl:
                 print("Saved character template not recognized; cannot load player.")
                 return
             self.template = tpl
             p = data["player"]
-            self.player = Actor(name=tpl.display_name, max_hp=p["max_hp"], hp=p["hp"], stats=p["stats"], moves=[
-                {"name": "Attack", "base": p["stats"].get("strength", 5), "type": "physical"},
-                {"name": "Magic", "base": p["stats"].get("magic", 5), "type": "magic"},
+            # older saves nest the stats in a "stats" dict
+            stats = p.get("stats", p)
+            strength, agility, magic = stats.get("strength", 5), stats.get("agility", 5), stats.get("magic", 5)
+            self.player = Actor(name=tpl.display_name, max_hp=p["max_hp"], hp=p["hp"], strength=strength, agility=agility,
+                                magic=magic, extra_stats=dict(p.get("extra_stats", {})), moves=[
+                {"name": "Attack", "base": strength, "type": "physical"},
+                {"name": "Magic", "base": magic, "type": "magic"},
                 {"name": "Focus", "base": 0, "type": "buff"},
             ])
-            self.inventory = [Item(n, d, e) for (n, d, e) in data.get("inventory", [])]
-            self.current_scene = data.get("current_scene", "start")
-            self.flags = set(data.get("flags", []))
+            self.set_inventory(_items_from_save(data.get("inventory", [])))
+            self.current_scene = sys.intern(data.get("current_scene", "start"))
+            self.flags = {sys.intern(f) for f in data.get("flags", [])}
             print("Game loaded. Welcome back, " + self.player.name + "!")
         except Exception as e:
             print("Failed to load save:", e)
@@ -454,7 +727,7 @@ class TextGame:
         while True:
             if self.player is None:
                 print("\nStart Menu: (N)ew game, (L)oad game, (Q)uit")
-                cmd = prompt_choice("Choice: ", ["n", "l", "q"])
+                cmd = prompt_choice("Choice: ", _START_MENU)
                 if cmd == "n":
                     self.choose_character()
                 elif cmd == "l":
@@ -472,102 +745,131 @@ class TextGame:
                     print("You wander into nothingness and find yourself back at the start.")
                     self.current_scene = "start"
                     continue
-                # Print scene header and description
-                print("\n== " + scene["title"] + " ==")
-                print(scene["desc"])
-                # Print choices
+                # Print scene header, description and choices (or ending banner) in one write
+                sys.stdout.write(scene["_full_render"])
                 if not scene["choices"]:
                     # terminal scene (ending)
-                    print("\n*** ENDING: " + scene["title"] + " ***")
-                    print(scene["desc"])
                     # Offer to save or quit or start new game
-                    post = prompt_choice("\n(S)ave, (N)ew Game, (Q)uit: ", ["s", "n", "q"])
+                    post = prompt_choice("\n(S)ave, (N)ew Game, (Q)uit: ", _ENDING_MENU)
                     if post == "s":
                         self.save_game()
                         continue
                     if post == "n":
                         # reset for a new game
+                        self.scenes = SCENES
                         self.player = None
                         self.template = None
-                        self.inventory = [Item("Small Potion", "Heals 25 HP.", {"heal": 25}), Item("Smoke Bomb", "Escape attempt (60%).", {"escape": 0.6})]
+                        self.set_inventory(_STARTING_INV)
                         self.flags = set()
                         self.current_scene = "start"
                         break  # break to outer loop to choose character/new game
                     if post == "q":
                         print("Farewell.")
                         return
-                # list choices for non-ending scenes
-                for i, (text, next_scene, effect) in enumerate(scene["choices"], start=1):
-                    print(f"{i}. {text}")
-                print("I. Inventory | S. Save | R. Rest (where available) | Q. Quit")
                 choice = input("Choice: ").strip().lower()
-                if choice == "i":
-                    self.show_inventory()
+                command = self._scene_commands.get(choice)
+                if command is not None:
+                    if command():
+                        break  # return to start menu
                     continue
-                if choice == "s":
-                    self.save_game()
-                    continue
-                if choice == "q":
-                    print("Quitting to main menu.")
-                    self.player = None
-                    self.template = None
-                    self.current_scene = "start"
-                    break  # return to start menu
                 # numeric choice
-                if not choice.isdigit():
-                    print("Enter the number of a choice, or a command like I/S/Q.")
+                if choice not in scene["_valid_inputs"]:
+                    if choice.isdigit():
+                        print("Invalid choice number.")
+                    else:
+                        print("Enter the number of a choice, or a command like I/S/Q.")
                     continue
                 idx = int(choice) - 1
-                if idx < 0 or idx >= len(scene["choices"]):
-                    print("Invalid choice number.")
-                    continue
                 # apply the chosen option
                 text, next_scene, effect = scene["choices"][idx]
                 # Effects can be: enemy spawn, item grant, flag set, heal numeric, requires specific flag
                 # First, check requirements:
-                if effect and isinstance(effect, dict) and "requires" in effect:
-                    req = effect["requires"]
-                    # allow both flag name string or an Item name
-                    if isinstance(req, str) and req not in self.flags and not any(it.name == req for it in self.inventory):
-                        print("You do not have the required condition to take that action.")
-                        continue
-                # Handle combat initiation
-                if effect and isinstance(effect, dict) and "enemy" in effect:
-                    enemy_key = effect["enemy"]
-                    self.do_combat(enemy_key)
-                    # after combat, possibly jump to a special 'after' scene
-                    if effect.get("after"):
-                        self.current_scene = effect["after"]
-                    else:
-                        # if victory, go to next_scene; if defeated -> ending will handle inside combat
-                        self.current_scene = next_scene
-                    continue
-                # Handle giving an item
-                if effect and isinstance(effect, dict) and "item" in effect:
-                    item = effect["item"]
-                    self.inventory.append(item)
-                    print(f"You obtained: {item.name} — {item.description}")
-                # Handle heal effect (like rest)
-                if effect and isinstance(effect, dict) and "heal" in effect:
-                    amt = effect["heal"]
-                    old = self.player.hp
-                    self.player.hp = clamp(self.player.hp + amt, 0, self.player.max_hp)
-                    print(f"You recovered {self.player.hp - old} HP by resting.")
-                # Handle flags
-                if effect and isinstance(effect, dict) and "flag" in effect:
-                    self.flags.add(effect["flag"])
-                    print(f"(Flag gained: {effect['flag']})")
-                # Handle direct ending
-                if effect and isinstance(effect, dict) and "ending" in effect:
-                    ending_id = effect["ending"]
-                    self.current_scene = "ending_" + ending_id if "ending_" + ending_id in self.scenes else ending_id
+                req = effect.get("requires") if effect else None
+                # allow both flag name string or an Item name
+                if isinstance(req, str) and req not in self.flags and req not in self._inventory_names:
+                    print("You do not have the required condition to take that action.")
                     continue
-                # Normal transition to the next scene
-                self.current_scene = next_scene
+                # Apply each effect through its handler; a handler may redirect the next scene
+                target = next_scene
+                if effect:
+                    for key in effect:
+                        handler = self._effect_handlers.get(key)
+                        if handler is not None:
+                            redirect = handler(effect, next_scene)
+                            if redirect is not None:
+                                target = redirect
+                self.current_scene = target
+
+    def _quit_to_menu(self) -> bool:
+        """Drop the current run; returns True so the scene loop exits to the start menu."""
+        print("Quitting to main menu.")
+        self.player = None
+        self.template = None
+        self.current_scene = "start"
+        return True
+
+    # -------------------------
+    # Scene effects
+    # -------------------------
+    # Each handler receives the choice's effect dict and default next scene,
+    # and returns a scene id to go to instead, or None to keep the default.
+    def _eff_enemy(self, effect: Dict, next_scene: str) -> Optional[str]:
+        """Run combat, then continue to the 'after' scene if one is given."""
+        self.do_combat(effect["enemy"])
+        # if victory, go to next_scene; if defeated -> ending will handle inside combat
+        return effect.get("after") or next_scene
+
+    def _eff_item(self, effect: Dict, next_scene: str) -> Optional[str]:
+        """Grant an item."""
+        item = effect["item"]
+        self.add_item(item)
+        print(f"You obtained: {item.name} — {item.description}")
+        return None
+
+    def _eff_heal(self, effect: Dict, next_scene: str) -> Optional[str]:
+        """Heal effect (like rest)."""
+        old = self.player.hp
+        self.player.hp = clamp(self.player.hp + effect["heal"], 0, self.player.max_hp)
+        print(f"You recovered {self.player.hp - old} HP by resting.")
+        return None
+
+    def _eff_flag(self, effect: Dict, next_scene: str) -> Optional[str]:
+        """Set a story flag."""
+        self.flags.add(effect["flag"])
+        print(f"(Flag gained: {effect['flag']})")
+        return None
+
+    def _eff_ending(self, effect: Dict, next_scene: str) -> Optional[str]:
+        """Jump straight to an ending scene."""
+        return effect["_resolved_ending"]  # precomputed by compile_scenes
 
     # -------------------------
     # Inventory UI
     # -------------------------
+    # All inventory changes go through these so _inventory_names stays in sync.
+    def set_inventory(self, items: Iterable[Item]):
+        """Replace the whole inventory."""
+        self.inventory = list(items)
+        self._inventory_names = Counter(it.name for it in self.inventory)
+
+    def add_item(self, item: Item):
+        """Append an item to the inventory."""
+        self.inventory.append(item)
+        self._inventory_names[item.name] += 1
+
+    def remove_item(self, idx: int) -> Item:
+        """Remove and return the item at index idx."""
+        item = self.inventory.pop(idx)
+        names = self._inventory_names
+        names[item.name] -= 1
+        if not names[item.name]:
+            del names[item.name]
+        return item
+
+    def has_item(self, name: str) -> bool:
+        """True if an item with this name is in the inventory."""
+        return name in self._inventory_names
+
     def show_inventory(self):
         """Display inventory and allow using items."""
         if not self.inventory:
@@ -599,41 +901,69 @@ class TextGame:
         Effects implemented: heal, escape (only during combat), buff (permanent for simplicity).
         """
         item = self.inventory[idx]
-        if "heal" in item.effect:
-            amt = item.effect["heal"]
-            old = self.player.hp
-            self.player.hp = clamp(self.player.hp + amt, 0, self.player.max_hp)
-            print(f"You used {item.name}: HP {old} -> {self.player.hp}.")
-            del self.inventory[idx]
-            return
-        if "escape" in item.effect:
-            print("That item is only usable in a fight to attempt escape.")
-            return
-        if "buff" in item.effect:
-            stat, amt, dur = item.effect["buff"]
-            self.player.stats[stat] = self.player.stats.get(stat, 0) + amt
-            print(f"{item.name} permanently increased your {stat} by {amt}.")
-            del self.inventory[idx]
+        apply = _ITEM_APPLY.get(item.kind)
+        if apply is None:
+            print("Item could not be used.")
             return
-        print("Item could not be used.")
+        apply(self, item, idx)
+
+    # -------------------------
+    # COMBAT RNG
+    # -------------------------
+    def _take_u32(self, n: int) -> Sequence[int]:
+        """Next n uniform 32-bit words from the batch buffer as one slice (used once per combat round)."""
+        i = self._u32_idx
+        if i + n > len(self._u32_buf):
+            self._u32_buf = memoryview(self._rng.randbytes(4 * _RNG_BATCH)).cast("I")
+            i = 0
+        self._u32_idx = i + n
+        return self._u32_buf[i:i + n]
+
+    def _below(self, w: int, n: int) -> int:
+        """
+        Map a 32-bit word w from the round's slice to an unbiased int in range(n).
+        Lemire's multiply-shift: the high word of w * n is the result. Plain
+        multiply-shift would favour some outcomes by up to n / 2**32; the few words
+        that cause this (low word under 2**32 % n) are rejected and replaced by a
+        fresh draw, which happens with probability below n / 2**32 per call.
+        """
+        m = w * n
+        if (m & 0xFFFFFFFF) < n:  # cheap pre-check: only then can w be in the biased zone
+            t = (1 << 32) % n
+            while (m & 0xFFFFFFFF) < t:
+                m = self._take_u32(1)[0] * n
+        return m >> 32
+
+    def _flush_out(self):
+        """Write any buffered combat text in a single call."""
+        if self._out:
+            self._out.append("")
+            sys.stdout.write("\n".join(self._out))
+            self._out.clear()
 
     # -------------------------
     # COMBAT SYSTEM
     # -------------------------
     def spawn_enemy(self, key: str) -> Actor:
         """Create an Actor (enemy) scaled to player's stats for challenge balance."""
-        template = ENEMIES.get(key)
-        if not template:
+        proto = _ENEMY_PROTOTYPES.get(key)
+        if proto is None:
             # fallback generic enemy
-            return Actor("Faint Echo", 30, 30, {"strength": 5, "agility": 5, "magic": 5}, moves=[
-                {"name": "Tap", "base": 4, "type": "physical"}
-            ])
+            return Actor("Faint Echo", 30, 30, 5, 5, 5, moves=(
+                {"name": "Tap", "base": 4, "type": "physical"},
+            ))
         # scale enemy HP slightly by player's overall power to keep it engaging
-        player_power = sum(self.player.stats.values()) if self.player else 15
+        p = self.player
+        player_power = p.strength + p.agility + p.magic + sum(p.extra_stats.values()) if p else 15
         scale = 1.0 + (player_power - 15) / 80.0  # small scale factor
-        hp = max(10, int(template["hp"] * scale))
-        moves = template["moves"]
-        return Actor(template["name"], hp, hp, {"strength": template["str"], "agility": template["agi"], "magic": template["mag"]}, moves=moves)
+        hp = max(10, int(proto.max_hp * scale))
+        # shallow copy: the moves list is read-only during combat and can be shared
+        enemy = copy.copy(proto)
+        enemy.extra_stats = {}
+        enemy.status_mask = 0
+        enemy.status_dur = _no_statuses()
+        enemy.max_hp = enemy.hp = hp
+        return enemy
 
     def do_combat(self, enemy_key: str):
         """
@@ -641,126 +971,247 @@ class TextGame:
         Player chooses actions from menu; then enemy acts.
         Implements hit chance, damage calculation, status effects (simple), and item use during combat.
         """
+        try:
+            self._combat_loop(enemy_key)
+        finally:
+            self._flush_out()
+
+    def _combat_loop(self, enemy_key: str):
+        """
+        Interactive driver for do_combat: reads actions from input, resolves each round
+        with resolve_player_action/resolve_enemy_turn and applies the story side effects
+        (rewards, defeat endings). Combat text goes through self._emit.
+        """
         enemy = self.spawn_enemy(enemy_key)
-        print(f"\n--- COMBAT START: {enemy.name} appears! ---")
+        emit = self._emit
+        emit(f"\n--- COMBAT START: {enemy.name} appears! ---")
         # small tactical hint
-        print("Hint: Use items with 'U 1' style, or press 'F' to attempt to flee.")
-        while enemy.is_alive() and self.player.is_alive():
+        emit("Hint: Use items with 'U 1' style, or press 'F' to attempt to flee.")
+        # Hoist lookups out of the turn loop: enemy stats never change during a fight
+        player = self.player
+        flags = self.flags  # a set: O(1) membership
+        e_agi, moves, n_moves, move_handler = self._enemy_turn_inputs(enemy)
+        outcome = None
+        # liveness is checked as hp > 0 inline (Actor.is_alive stays for other callers)
+        while outcome is None and enemy.hp > 0 and player.hp > 0:
             # Player turn
-            print(f"\nYour HP: {self.player.hp}/{self.player.max_hp} | {enemy.name} HP: {enemy.hp}/{enemy.max_hp}")
-            print("1) Attack   2) Magic   3) Use Item   4) Focus (small buff)   F) Flee")
+            emit(f"\nYour HP: {player.hp}/{player.max_hp} | {enemy.name} HP: {enemy.hp}/{enemy.max_hp}")
+            emit("1) Attack   2) Magic   3) Use Item   4) Focus (small buff)   F) Flee")
+            self._flush_out()  # the prompt must follow everything emitted so far
             action = input("Choose action: ").strip().lower()
-            if action == "1":
-                # physical attack: hit chance influenced by agilities
-                hit_roll = roll(1, 20) + self.player.stats.get("agility", 5) // 2
-                defend = 8 + enemy.stats.get("agility", 5) // 2
-                if hit_roll >= defend:
-                    # damage computation uses strength plus small randomness
-                    base = self.player.stats.get("strength", 5)
-                    rand = random.randint(-3, 3)
-                    damage = max(1, base + rand)
-                    enemy.hp = max(0, enemy.hp - damage)
-                    print(f"You strike with Attack for {damage} damage.")
-                else:
-                    print("Your attack missed!")
-            elif action == "2":
-                # magic attack: uses magic stat; slightly different hit rules
-                hit_roll = roll(1, 20) + self.player.stats.get("magic", 5) // 2
-                defend = 7 + enemy.stats.get("agility", 5) // 2
-                if hit_roll >= defend:
-                    base = self.player.stats.get("magic", 5)
-                    damage = max(1, base + random.randint(-4, 4))
-                    enemy.hp = max(0, enemy.hp - damage)
-                    print(f"You unleash Magic for {damage} damage.")
-                else:
-                    print("Your magic fizzles and fails.")
-            elif action == "3" or action.startswith("u"):
-                # Use item during combat
-                self.show_inventory()
-                # show_inventory already asks for U <num>, and use_item handles combat-only items like escape
-                # After using a smoke bomb (escape) the combat loop checks for escape effect below via thrown item behavior
-            elif action == "4":
-                # Focus: small self-buff using magic to increase next attack potency
-                self.player.status_effects["focused"] = 2  # lasts 2 turns
-                print("You gather yourself. Your next attacks are empowered.")
-            elif action == "f":
-                # attempt to flee based on agility difference
-                chance = 0.3 + (self.player.stats.get("agility", 5) - enemy.stats.get("agility", 5)) * 0.02
-                if random.random() < chance:
-                    print("You successfully fled the battle.")
-                    return
-                else:
-                    print("Flee attempt failed.")
-            else:
-                print("Unknown action; try again.")
+            handler = self._combat_dispatch.get(action)
+            if handler is None and action.startswith("u"):
+                handler = self._use_item_combat
+            if handler is None:
+                emit("Unknown action; try again.")
                 continue
+            # all random draws for this round in one slice (see _ROUND_DRAWS)
+            u = self._take_u32(_ROUND_DRAWS)
+            outcome = (self.resolve_player_action(enemy, handler, u)
+                       or self.resolve_enemy_turn(enemy, u, e_agi, moves, n_moves, move_handler))
 
-            # Check if enemy died by player's action before enemy turn
-            if not enemy.is_alive():
-                print(f"You defeated {enemy.name}!")
-                # reward: small chance for item or flag
-                if enemy_key == "wolf_spirit" and random.random() < 0.4:
-                    self.inventory.append(Item("Wolf Pelt", "A pelt of a spectral wolf.", {}))
-                    print("You recover a Wolf Pelt.")
-                if enemy_key == "throne_shadow":
-                    # the final boss, higher stakes handled by caller (scene flow)
-                    pass
-                return
-
-            # Enemy turn: simple AI picks a move at random
-            # Some moves are debuffs (like 'Howl' could lower accuracy)
-            move = random.choice(enemy.moves)
-            print(f"{enemy.name} uses {move['name']}!")
-            # Evaluate hit
-            e_hit_roll = roll(1, 20) + enemy.stats.get("agility", 5) // 2
-            p_defend = 7 + self.player.stats.get("agility", 5) // 2
-            if e_hit_roll >= p_defend:
-                # base damage depends on move and enemy strength/magic
-                if move["type"] == "physical":
-                    dmg = max(1, int(move["base"] + enemy.stats.get("strength", 5) * 0.3) + random.randint(-2, 2))
-                    self.player.hp = max(0, self.player.hp - dmg)
-                    print(f"It hits you for {dmg} damage.")
-                elif move["type"] == "magic":
-                    dmg = max(1, int(move["base"] + enemy.stats.get("magic", 5) * 0.35) + random.randint(-3, 2))
-                    self.player.hp = max(0, self.player.hp - dmg)
-                    print(f"Magic wounds you for {dmg} damage.")
-                elif move["type"] == "drain":
-                    dmg = max(1, int(move["base"] + enemy.stats.get("magic", 5) * 0.25))
-                    self.player.hp = max(0, self.player.hp - dmg)
-                    enemy.hp = min(enemy.max_hp, enemy.hp + dmg // 2)
-                    print(f"The attack drains {dmg} HP and heals the enemy a bit.")
-                elif move["type"] == "debuff":
-                    # apply a simple debuff like 'howl' -> player gets 'shaken' reducing next hit chance
-                    self.player.status_effects["shaken"] = 2
-                    print("You are shaken and less steady (reduced hit chance).")
+        if outcome == WON:
+            # reward: small chance for item or flag
+            if enemy_key == "wolf_spirit" and self._below(u[6], 10) < 4:
+                self.add_item(ITEMS["wolf_pelt"])
+                emit("You recover a Wolf Pelt.")
+            # the final boss (throne_shadow): higher stakes handled by caller (scene flow)
+        elif outcome == LOST:
+            # optionally implement sacrifice option if certain flags set
+            if "villager_token" in flags:
+                # special sacrifice branch: convert to ending_sacrifice
+                emit("Your sacrifice seals a weakening of the shadow.")
+                self.current_scene = "ending_sacrifice"
             else:
-                print(f"{enemy.name}'s attack misses!")
+                self.current_scene = "ending_flee"  # default "defeat leads to flee/defeat" (could be changed)
+
+    # Round resolution, free of input(): both return an outcome (WON, LOST, FLED)
+    # when the fight ends, else None. u is the round's random words (_ROUND_DRAWS).
+    def _enemy_turn_inputs(self, enemy: Actor):
+        """Per-fight inputs for resolve_enemy_turn, read once by each driver before its loop."""
+        # enemy moves are a static tuple: pick by index instead of a random.choice-style call
+        moves = enemy.moves
+        return enemy.agility, moves, len(moves), self._move_handlers.get
+
+    def resolve_player_action(self, enemy: Actor, handler, u: Sequence[int]) -> Optional[str]:
+        """Run one player action handler (from self._combat_dispatch) against enemy."""
+        if handler(enemy, u):
+            # handler ended the fight (successful flee)
+            return FLED
+        if enemy.hp <= 0:
+            self._emit(f"You defeated {enemy.name}!")
+            return WON
+        return None
+
+    def resolve_enemy_turn(self, enemy: Actor, u: Sequence[int], e_agi: int, moves: Sequence[Dict],
+                           n_moves: int, move_handler: Callable) -> Optional[str]:
+        """
+        Enemy turn: simple AI picks a move at random, then statuses decay.
+        e_agi, moves, n_moves and move_handler come from _enemy_turn_inputs(enemy).
+        """
+        emit = self._emit
+        player = self.player
+        # Some moves are debuffs (like 'Howl' could lower accuracy)
+        move = moves[self._below(u[5], n_moves)]
+        emit(f"{enemy.name} uses {move['name']}!")
+        # Evaluate hit
+        e_hit_roll = self._below(u[2], 20) + 1 + e_agi // 2
+        p_defend = 7 + player.agility // 2
+        if e_hit_roll >= p_defend:
+            # base damage depends on move type and enemy strength/magic
+            handler = move_handler(move["type"])
+            if handler is not None:
+                handler(move, enemy, u[3])
+        else:
+            emit(f"{enemy.name}'s attack misses!")
 
-            # Process simple status effects decay at end of enemy turn
-            self.decay_statuses(self.player)
+        # Process simple status effects decay at end of enemy turn (skipped when there are none)
+        if player.status_mask:
+            self.decay_statuses(player)
+        if enemy.status_mask:
             self.decay_statuses(enemy)
 
-            # If player died, break loop and handle defeat
-            if not self.player.is_alive():
-                print("You have been defeated...")
-                # optionally implement sacrifice option if certain flags set
-                if "villager_token" in self.flags:
-                    # special sacrifice branch: convert to ending_sacrifice
-                    print("Your sacrifice seals a weakening of the shadow.")
-                    self.current_scene = "ending_sacrifice"
-                else:
-                    self.current_scene = "ending_flee"  # default "defeat leads to flee/defeat" (could be changed)
-                return
+        if player.hp <= 0:
+            emit("You have been defeated...")
+            return LOST
+        return None
+
+    def simulate_fight(self, enemy: Actor, policy: Callable[[Actor, Actor], str], max_rounds: int = 500) -> str:
+        """
+        Headless driver: fight enemy with self.player, choosing actions with policy(player, enemy),
+        which must return a combat action key other than item use ("1", "2", "4" or "f").
+        Returns the outcome, or TIMEOUT after max_rounds.
+        Raises ValueError for any other action: item use would prompt with input().
+        """
+        dispatch = {k: h for k, h in self._combat_dispatch.items() if k is not _A3}
+        player = self.player
+        e_agi, moves, n_moves, move_handler = self._enemy_turn_inputs(enemy)
+        for _ in range(max_rounds):
+            action = policy(player, enemy)
+            handler = dispatch.get(action)
+            if handler is None:
+                raise ValueError(f"simulate_fight: unsupported policy action {action!r}")
+            u = self._take_u32(_ROUND_DRAWS)
+            outcome = (self.resolve_player_action(enemy, handler, u)
+                       or self.resolve_enemy_turn(enemy, u, e_agi, moves, n_moves, move_handler))
+            if outcome is not None:
+                return outcome
+        return TIMEOUT
+
+    # Player combat actions: each gets the enemy and the round's random words
+    # (see _ROUND_DRAWS) and returns True if it ends the fight.
+    def _attack(self, enemy: Actor, u: Sequence[int]) -> bool:
+        """Physical attack (see resolve_physical)."""
+        player = self.player
+        hit, damage = resolve_physical(player.strength, player.agility, enemy.agility,
+                                       self._below(u[0], 20) + 1, self._below(u[1], 7) - 3)
+        if hit:
+            enemy.hp = enemy.hp - damage if enemy.hp > damage else 0
+            self._emit(f"You strike with Attack for {damage} damage.")
+        else:
+            self._emit("Your attack missed!")
+        return False
+
+    def _magic(self, enemy: Actor, u: Sequence[int]) -> bool:
+        """Magic attack (see resolve_magic)."""
+        hit, damage = resolve_magic(self.player.magic, enemy.agility, self._below(u[0], 20) + 1, self._below(u[1], 9) - 4)
+        if hit:
+            enemy.hp = enemy.hp - damage if enemy.hp > damage else 0
+            self._emit(f"You unleash Magic for {damage} damage.")
+        else:
+            self._emit("Your magic fizzles and fails.")
+        return False
+
+    def _use_item_combat(self, enemy: Actor, u: Sequence[int]) -> bool:
+        """Use an item during combat."""
+        # show_inventory already asks for U <num>, and use_item handles combat-only items like escape
+        self.show_inventory()
+        return False
+
+    def _focus(self, enemy: Actor, u: Sequence[int]) -> bool:
+        """Focus: small self-buff using magic to increase next attack potency."""
+        player = self.player
+        player.status_mask |= FOCUSED
+        player.status_dur[_FOCUSED_I] = 2  # lasts 2 turns
+        self._emit("You gather yourself. Your next attacks are empowered.")
+        return False
+
+    def _flee(self, enemy: Actor, u: Sequence[int]) -> bool:
+        """Attempt to flee based on agility difference."""
+        idx = self.player.agility - enemy.agility - _FLEE_MIN_DIFF
+        idx = 0 if idx < 0 else _FLEE_MAX_IDX if idx > _FLEE_MAX_IDX else idx
+        if self._below(u[4], 100) < _FLEE_CHANCE_X100[idx]:
+            self._emit("You successfully fled the battle.")
+            return True
+        self._emit("Flee attempt failed.")
+        return False
+
+    # Enemy moves, dispatched on move["type"] after the move has hit; uj is the
+    # round's random word for damage jitter. Clamps are conditional expressions:
+    # no max()/min() builtin call per turn.
+    def _enemy_physical(self, move: Dict, enemy: Actor, uj: int):
+        player = self.player
+        dmg = enemy_physical_damage(move["base"], enemy.strength, self._below(uj, 5) - 2)
+        player.hp = player.hp - dmg if player.hp > dmg else 0
+        self._emit(f"It hits you for {dmg} damage.")
+
+    def _enemy_magic(self, move: Dict, enemy: Actor, uj: int):
+        player = self.player
+        dmg = enemy_magic_damage(move["base"], enemy.magic, self._below(uj, 6) - 3)
+        player.hp = player.hp - dmg if player.hp > dmg else 0
+        self._emit(f"Magic wounds you for {dmg} damage.")
+
+    def _enemy_drain(self, move: Dict, enemy: Actor, uj: int):
+        player = self.player
+        dmg = enemy_drain_damage(move["base"], enemy.magic)
+        player.hp = player.hp - dmg if player.hp > dmg else 0
+        healed = enemy.hp + dmg // 2
+        enemy.hp = healed if healed < enemy.max_hp else enemy.max_hp
+        self._emit(f"The attack drains {dmg} HP and heals the enemy a bit.")
+
+    def _enemy_debuff(self, move: Dict, enemy: Actor, uj: int):
+        # apply a simple debuff like 'howl' -> player gets 'shaken' reducing next hit chance
+        player = self.player
+        player.status_mask |= SHAKEN
+        player.status_dur[_SHAKEN_I] = 2
+        self._emit("You are shaken and less steady (reduced hit chance).")
 
     def decay_statuses(self, actor: Actor):
-        """Reduce durations of status effects and remove them when they expire."""
-        to_remove = []
-        for s in list(actor.status_effects.keys()):
-            actor.status_effects[s] -= 1
-            if actor.status_effects[s] <= 0:
-                to_remove.append(s)
-        for s in to_remove:
-            del actor.status_effects[s]
+        """Reduce durations of status effects and clear their bits when they expire."""
+        mask = actor.status_mask
+        if not mask:
+            return  # common case: nothing active
+        dur = actor.status_dur
+        for i in range(NUM_STATUSES):
+            if dur[i]:
+                dur[i] -= 1
+                if not dur[i]:
+                    mask &= ~(1 << i)
+        actor.status_mask = mask
+
+# -------------------------
+# HEADLESS SIMULATION
+# -------------------------
+
+def attack_policy(player: Actor, enemy: Actor) -> str:
+    """Default scripted policy: always use the stronger of Attack and Magic."""
+    return _A2 if player.magic > player.strength else _A1
+
+def batch_simulate(enemy_key: str, n: int, template_key: str = "sans",
+                   policy: Callable[[Actor, Actor], str] = attack_policy,
+                   seed: Optional[int] = None) -> Dict[str, int]:
+    """
+    Fight n fresh copies of an enemy with a fresh player built from template_key,
+    without any input or output, and return how often each outcome occurred.
+    Useful for balance testing, e.g. batch_simulate("throne_shadow", 10000).
+    """
+    game = TextGame(seed=seed, interactive=False, quiet=True)
+    template = _TEMPLATE_BY_KEY[template_key]
+    results: Counter = Counter()
+    for _ in range(n):
+        game.player = new_player(template)
+        results[game.simulate_fight(game.spawn_enemy(enemy_key), policy)] += 1
+    return dict(results)
 
 # -------------------------
 # ENTRYPOINT
@@ -768,7 +1219,8 @@ class TextGame:
 
 def main():
     print("=== AU RPG (Text Edition) ===")
-    game = TextGame()
+    # buffer combat output when input is scripted (piped) rather than typed
+    game = TextGame(interactive=sys.stdin.isatty())
     game.play()
 
 if __name__ == "__main__":